@@ -18,6 +18,10 @@ def create_app():
     db.init_app(app)
     login_manager.init_app(app)
 
+    from app.services.timetable_services import init_breaker
+
+    init_breaker(app.instance_path)
+
     # Import blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
@@ -34,4 +34,9 @@ def login():
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for("auth.login"))
+    resp = redirect(url_for("auth.login"))
+    # Drop the HTTP cache; script.js clears the offline timetable copy
+    # (IndexedDB + service worker caches) before submitting the logout form.
+    # "storage" is not sent because it would also wipe localStorage (theme).
+    resp.headers["Clear-Site-Data"] = '"cache"'
+    return resp
@@ -1,6 +1,11 @@
-from flask import Blueprint, render_template, flash, redirect, url_for
+from flask import Blueprint, render_template, flash, redirect, url_for, jsonify, request, send_from_directory
 from werkzeug.security import check_password_hash, generate_password_hash
-from app.services.timetable_services import fetch_timetable_data, build_maps_and_grids
+from app.services.timetable_services import (
+    fetch_timetable_data,
+    build_maps_and_grids,
+    build_raw_meta,
+    get_timetable_version,
+)
 from flask import current_app as app
 from flask_login import current_user, login_required
 from app.forms import SettingsForm
@@ -15,9 +20,39 @@ main_bp = Blueprint("main", __name__)
 def index():
     raw = fetch_timetable_data()
     if not raw:
-        return "<h3 style='color:red'>Error: could not fetch timetable from API. Check API_KEY and connectivity.</h3>"
-    prepared = build_maps_and_grids(raw)
-    return render_template("timetable.html", data=prepared)
+        # Non-2xx so the service worker keeps serving its last good copy
+        return "<h3 style='color:red'>Error: could not fetch timetable from API. Check API_KEY and connectivity.</h3>", 502
+    # Only the version and title go into the page; the browser reuses its
+    # IndexedDB copy when the version matches, otherwise calls /api/timetable.
+    return render_template(
+        "timetable.html",
+        data={"raw_meta": build_raw_meta(raw)},
+        version=get_timetable_version(raw),
+    )
+
+
+@main_bp.route("/api/timetable")
+@login_required
+def timetable_json():
+    raw = fetch_timetable_data()
+    if not raw:
+        return jsonify({"error": "Could not fetch timetable from API."}), 502
+    version = get_timetable_version(raw)
+    if version in request.if_none_match:
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify({"version": version, "data": build_maps_and_grids(raw)})
+    resp.set_etag(version)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+@main_bp.route("/sw.js")
+def service_worker():
+    # Served from the site root so the worker's scope covers every page.
+    resp = send_from_directory(app.static_folder, "sw.js", max_age=0)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 
 @main_bp.route("/settings", methods=["POST", "GET"])
@@ -0,0 +1,217 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: state is still shared between threads, not processes
+    fcntl = None
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _log(msg: str, *args):
+    print("[circuit_breaker]", msg % args if args else msg)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when the breaker refuses an upstream call (open or over budget)."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker with a per-minute request budget.
+
+    State lives in a small JSON file guarded by an exclusive file lock, so every
+    worker process on the host sees the same open/half-open state and budget.
+      - closed: calls pass; opens when the failure rate over the last
+        `window` seconds reaches `failure_threshold` (after `min_calls` calls)
+      - open: calls are refused until the backoff delay expires; each
+        consecutive trip doubles the delay (capped, with jitter)
+      - half_open: a single probe call is let through; only that probe's
+        outcome (matched by the token from allow_request) closes or re-opens
+        the breaker, late results from calls started earlier are ignored
+
+    A malformed state file is reset; if it cannot be read or written the
+    breaker fails open.
+    """
+
+    def __init__(
+        self,
+        state_file: str,
+        failure_threshold: float = 0.5,
+        min_calls: int = 4,
+        window: float = 60.0,
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        max_per_minute: int = 30,
+        probe_timeout: float = 30.0,
+    ):
+        self.state_file = state_file
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_per_minute = max_per_minute
+        self.probe_timeout = probe_timeout
+        self._thread_lock = threading.Lock()
+
+    # ---------- shared state ----------
+    @staticmethod
+    def _initial_state() -> Dict[str, Any]:
+        return {
+            "state": CLOSED,
+            "open_until": 0.0,
+            "trips": 0,
+            "probe_until": 0.0,
+            "probe_id": "",
+            "outcomes": [],
+            "requests": [],
+        }
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, Any]]:
+        """Load state under an exclusive lock and write it back on exit."""
+        with self._thread_lock:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(self.state_file, "a+") as fh:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    fh.seek(0)
+                    try:
+                        state = json.loads(fh.read() or "{}")
+                    except ValueError:
+                        state = {}
+                    merged = self._initial_state()
+                    if isinstance(state, dict):
+                        merged.update(state)
+                    if not self._is_valid(merged):
+                        _log("Ignoring malformed breaker state in %s", self.state_file)
+                        merged = self._initial_state()
+                    yield merged
+                    fh.seek(0)
+                    fh.truncate()
+                    fh.write(json.dumps(merged))
+                    fh.flush()
+                finally:
+                    if fcntl:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _is_valid(state: Dict[str, Any]) -> bool:
+        """True if every field has the shape the breaker expects."""
+
+        def is_num(v):
+            return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+        return (
+            state["state"] in (CLOSED, OPEN, HALF_OPEN)
+            and all(is_num(state[k]) for k in ("open_until", "trips", "probe_until"))
+            and isinstance(state["probe_id"], str)
+            and isinstance(state["requests"], list)
+            and all(is_num(t) for t in state["requests"])
+            and isinstance(state["outcomes"], list)
+            and all(
+                isinstance(o, list) and len(o) == 2 and all(is_num(x) for x in o)
+                for o in state["outcomes"]
+            )
+        )
+
+    def _prune(self, state: Dict[str, Any], now: float):
+        state["outcomes"] = [o for o in state["outcomes"] if now - o[0] < self.window]
+        state["requests"] = [t for t in state["requests"] if now - t < 60.0]
+
+    def _backoff(self, trips: int) -> float:
+        """Exponential backoff with jitter: a random delay in [d/2, d]."""
+        delay = min(self.max_backoff, self.base_backoff * (2 ** max(trips - 1, 0)))
+        return random.uniform(delay / 2, delay)
+
+    def _trip(self, state: Dict[str, Any], now: float):
+        state["trips"] += 1
+        state["state"] = OPEN
+        state["open_until"] = now + self._backoff(state["trips"])
+        state["probe_until"] = 0.0
+        state["probe_id"] = ""
+        state["outcomes"] = []
+
+    # ---------- public API ----------
+    def allow_request(self) -> Tuple[bool, str, Optional[str]]:
+        """
+        Reserve a slot for one upstream call. Returns (allowed, reason, token);
+        pass the token back to record_success/record_failure.
+        """
+        try:
+            return self._allow_request()
+        except (OSError, ValueError, TypeError) as e:
+            _log("State file unavailable, allowing call: %s", str(e))
+            return True, "breaker state unavailable", None
+
+    def _allow_request(self) -> Tuple[bool, str, Optional[str]]:
+        now = time.time()
+        with self._locked_state() as state:
+            self._prune(state, now)
+
+            if state["state"] == OPEN:
+                if now < state["open_until"]:
+                    return False, "circuit open (retry in %.0fs)" % (state["open_until"] - now), None
+                state["state"] = HALF_OPEN
+                state["probe_until"] = 0.0
+                state["probe_id"] = ""
+
+            if state["state"] == HALF_OPEN:
+                if now < state["probe_until"]:
+                    return False, "circuit half-open (probe in flight)", None
+                if len(state["requests"]) >= self.max_per_minute:
+                    return False, "upstream request budget exhausted", None
+                state["probe_until"] = now + self.probe_timeout
+                state["probe_id"] = uuid.uuid4().hex
+                state["requests"].append(now)
+                return True, "half-open probe", state["probe_id"]
+
+            if len(state["requests"]) >= self.max_per_minute:
+                return False, "upstream request budget exhausted", None
+            state["requests"].append(now)
+            return True, "closed", None
+
+    def record_success(self, token: Optional[str] = None):
+        try:
+            self._record(True, token)
+        except (OSError, ValueError, TypeError) as e:
+            _log("State file unavailable, success not recorded: %s", str(e))
+
+    def record_failure(self, token: Optional[str] = None):
+        try:
+            self._record(False, token)
+        except (OSError, ValueError, TypeError) as e:
+            _log("State file unavailable, failure not recorded: %s", str(e))
+
+    def _record(self, ok: bool, token: Optional[str]):
+        now = time.time()
+        with self._locked_state() as state:
+            self._prune(state, now)
+            if state["state"] != CLOSED:
+                # Only the current probe decides; calls started before the
+                # trip (or an expired probe) report too late to count.
+                if not token or token != state["probe_id"]:
+                    return
+                if ok:
+                    state.update(state=CLOSED, trips=0, probe_until=0.0, probe_id="", outcomes=[])
+                else:
+                    self._trip(state, now)
+                return
+            state["outcomes"].append([now, 1 if ok else 0])
+            if ok:
+                return
+            calls = len(state["outcomes"])
+            failures = sum(1 for o in state["outcomes"] if not o[1])
+            if calls >= self.min_calls and failures / calls >= self.failure_threshold:
+                self._trip(state, now)
@@ -2,8 +2,10 @@ from dotenv import load_dotenv
 import os
 import time
 import requests
+import hashlib
 import json
 from typing import Any, Dict, List, Optional, Union
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
 
 load_dotenv()
 
@@ -12,9 +14,14 @@ API_KEY = os.getenv("TIMETABLE_API_KEY")
 BASE_URL = os.getenv("BASE_URL", "https://www.timetablemaster.com/api")
 TIMETABLE_ID = os.getenv("TIMETABLE_ID") or None
 CACHE_TTL = int(os.getenv("CACHE_TTL", "25"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "20"))
 # ----------------------------------------
 
-_cache: Dict[str, Any] = {"ts": 0.0, "data": None}
+# Shared across worker processes through a lock-protected state file;
+# created by init_breaker() from create_app()
+_breaker: Optional[CircuitBreaker] = None
+
+_cache: Dict[str, Any] = {"ts": 0.0, "data": None, "version": None}
 
 
 def _log(msg: str, *args):
@@ -37,6 +44,55 @@ def _build_headers() -> Dict[str, str]:
     return headers
 
 
+def _upstream_get(url: str, headers: Dict[str, str]) -> requests.Response:
+    """
+    GET through the circuit breaker. Raises CircuitOpenError without touching
+    the network when the breaker is open or the per-minute budget is spent.
+    Timeouts, connection errors, 429 and 5xx count as failures.
+    """
+    breaker = _breaker
+    if breaker is None:
+        # Used outside the app (no init_breaker call): plain request
+        return requests.get(url, headers=headers, timeout=UPSTREAM_TIMEOUT)
+
+    allowed, reason, token = breaker.allow_request()
+    if not allowed:
+        raise CircuitOpenError(f"Upstream call skipped: {reason}")
+    try:
+        resp = requests.get(url, headers=headers, timeout=UPSTREAM_TIMEOUT)
+    except requests.exceptions.RequestException:
+        breaker.record_failure(token)
+        raise
+    if resp.status_code == 429 or resp.status_code >= 500:
+        breaker.record_failure(token)
+    else:
+        breaker.record_success(token)
+    return resp
+
+
+def init_breaker(instance_path: str):
+    """Create the upstream breaker; state goes in the Flask instance folder unless BREAKER_STATE_FILE is set."""
+    global _breaker
+    _breaker = CircuitBreaker(
+        state_file=os.getenv("BREAKER_STATE_FILE") or os.path.join(instance_path, "upstream_breaker.json"),
+        failure_threshold=float(os.getenv("BREAKER_FAILURE_THRESHOLD", "0.5")),
+        min_calls=int(os.getenv("BREAKER_MIN_CALLS", "4")),
+        window=float(os.getenv("BREAKER_WINDOW", "60")),
+        base_backoff=float(os.getenv("BREAKER_BASE_BACKOFF", "5")),
+        max_backoff=float(os.getenv("BREAKER_MAX_BACKOFF", "300")),
+        max_per_minute=int(os.getenv("UPSTREAM_MAX_PER_MINUTE", "30")),
+        probe_timeout=UPSTREAM_TIMEOUT + 5,
+    )
+
+
+def _stale_or_none(reason: str) -> Optional[Dict]:
+    """Return the last good timetable (even if expired) after an upstream failure."""
+    if _cache["data"]:
+        _log("Serving stale timetable (age %.1fs): %s", time.time() - float(_cache["ts"]), reason)
+        return _cache["data"]
+    return None
+
+
 def _safe_json(resp: requests.Response) -> Any:
     """Return resp.json() but never raise to caller (returns dict/list or {})."""
     try:
@@ -123,6 +179,8 @@ def fetch_timetable_data(force_refresh: bool = False) -> Optional[Dict]:
     """
     Fetch timetable JSON from TimetableMaster live API.
     Uses a simple in-memory cache controlled by CACHE_TTL.
+    Upstream calls go through the circuit breaker; on failure the last good
+    timetable is returned if this process has one.
     Returns the parsed timetable dict (or None on failure).
     """
     now = time.time()
@@ -145,7 +203,7 @@ def fetch_timetable_data(force_refresh: bool = False) -> Optional[Dict]:
         if TIMETABLE_ID:
             url = f"{BASE_URL.rstrip('/')}/timetables/{TIMETABLE_ID}"
             _log("Fetching specific timetable: %s", url)
-            resp = requests.get(url, headers=headers, timeout=20)
+            resp = _upstream_get(url, headers)
             _log("Response status: %s", resp.status_code)
             resp.raise_for_status()
             result = _safe_json(resp)
@@ -155,7 +213,7 @@ def fetch_timetable_data(force_refresh: bool = False) -> Optional[Dict]:
             # Call the list endpoint to find a timetable (pick first published)
             list_url = f"{BASE_URL.rstrip('/')}/timetables"
             _log("Listing timetables: %s", list_url)
-            resp = requests.get(list_url, headers=headers, timeout=20)
+            resp = _upstream_get(list_url, headers)
             _log("List response status: %s", getattr(resp, "status_code", "N/A"))
             if resp is not None and resp.status_code != 200:
                 _log("List response body (truncated): %s", resp.text[:2000])
@@ -187,7 +245,7 @@ def fetch_timetable_data(force_refresh: bool = False) -> Optional[Dict]:
 
             url = f"{BASE_URL.rstrip('/')}/timetables/{chosen_id}"
             _log("Fetching chosen timetable: %s", url)
-            resp = requests.get(url, headers=headers, timeout=20)
+            resp = _upstream_get(url, headers)
             _log("Fetch chosen status: %s", resp.status_code)
             resp.raise_for_status()
             result = _safe_json(resp)
@@ -203,9 +261,12 @@ def fetch_timetable_data(force_refresh: bool = False) -> Optional[Dict]:
         # cache and return
         _cache["ts"] = now
         _cache["data"] = data
+        _cache["version"] = compute_timetable_version(data)
         _log("Timetable fetched and cached.")
         return data
 
+    except CircuitOpenError as ce:
+        return _stale_or_none(str(ce))
     except requests.exceptions.RequestException as re:
         _log("Network/HTTP error when calling API: %s", str(re))
         if resp is not None:
@@ -213,10 +274,26 @@ def fetch_timetable_data(force_refresh: bool = False) -> Optional[Dict]:
                 _log("Last response text (truncated): %s", resp.text[:2000])
             except Exception:
                 pass
-        return None
+        return _stale_or_none(str(re))
     except Exception as e:
         _log("Unexpected error: %s", str(e))
-        return None
+        return _stale_or_none(str(e))
+
+
+def compute_timetable_version(raw: Any) -> str:
+    """
+    Return a short, stable fingerprint of a timetable payload.
+    Clients compare it with their local copy to decide whether to re-download.
+    """
+    encoded = json.dumps(raw, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def get_timetable_version(raw: Any) -> str:
+    """Version of `raw`, reusing the fingerprint computed when it was cached."""
+    if raw is _cache["data"] and _cache["version"]:
+        return _cache["version"]
+    return compute_timetable_version(raw)
 
 
 def list_available_timetables() -> List[Dict]:
@@ -233,7 +310,7 @@ def list_available_timetables() -> List[Dict]:
     try:
         list_url = f"{BASE_URL.rstrip('/')}/timetables"
         _log("Listing timetables (catalog): %s", list_url)
-        resp = requests.get(list_url, headers=headers, timeout=20)
+        resp = _upstream_get(list_url, headers)
         _log("Catalog response status: %s", getattr(resp, "status_code", "N/A"))
         resp.raise_for_status()
         listing = _safe_json(resp)
@@ -260,6 +337,9 @@ def list_available_timetables() -> List[Dict]:
                 }
             )
         return normalized
+    except CircuitOpenError as ce:
+        _log("%s", str(ce))
+        return []
     except requests.exceptions.RequestException as re:
         _log("Network error while listing timetables: %s", str(re))
         if resp is not None:
@@ -273,6 +353,18 @@ def list_available_timetables() -> List[Dict]:
         return []
 
 
+def build_raw_meta(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the { name, id } header info without building the grids."""
+    if not raw or not isinstance(raw, dict):
+        return {}
+    return {
+        "name": raw.get("name")
+        or (raw.get("generalSettings") or {}).get("timetableName")
+        or raw.get("title"),
+        "id": raw.get("_id") or raw.get("id"),
+    }
+
+
 def build_maps_and_grids(raw: Dict[str, Any]) -> Dict[str, Any]:
     """
     Convert raw timetable payload into a structure the frontend expects:
@@ -447,10 +539,5 @@ def build_maps_and_grids(raw: Dict[str, Any]) -> Dict[str, Any]:
         "classes_grid": classes_grid,
         "teachers_grid": teachers_grid,
         "subjects_map": subjects_map,
-        "raw_meta": {
-            "name": raw.get("name")
-            or raw.get("generalSettings", {}).get("timetableName")
-            or raw.get("title"),
-            "id": raw.get("_id") or raw.get("id"),
-        },
+        "raw_meta": build_raw_meta(raw),
     }
@@ -143,7 +143,8 @@
     PERIODS = [],
     COLS = [],
     TIMES_ROWS = {},
-    currentView = "classes";
+    currentView = "classes",
+    SERVER_DATA;
   let contentArea,
     editorOverlay,
     editor,
@@ -159,6 +160,105 @@
   const uid = (p = "x") => p + Math.random().toString(36).slice(2, 9);
   const fmt = (t) => t || "";
 
+  // ---------- LOCAL TIMETABLE CACHE (IndexedDB) ----------
+  const IDB_NAME = "timetable-expert";
+  const IDB_STORE = "timetable";
+  const IDB_KEY = "current";
+  const SW_CACHE_PREFIX = "tt-";
+
+  function openTimetableDb() {
+    return new Promise((resolve, reject) => {
+      if (!window.indexedDB) return reject(new Error("IndexedDB unavailable"));
+      const req = indexedDB.open(IDB_NAME, 1);
+      req.onupgradeneeded = () => req.result.createObjectStore(IDB_STORE);
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+  async function readCachedTimetable() {
+    try {
+      const db = await openTimetableDb();
+      try {
+        return await new Promise((resolve, reject) => {
+          const req = db.transaction(IDB_STORE).objectStore(IDB_STORE).get(IDB_KEY);
+          req.onsuccess = () => resolve(req.result || null);
+          req.onerror = () => reject(req.error);
+        });
+      } finally {
+        db.close();
+      }
+    } catch (err) {
+      console.warn("Timetable cache read failed:", err);
+      return null;
+    }
+  }
+  async function writeCachedTimetable(entry) {
+    try {
+      const db = await openTimetableDb();
+      const tx = db.transaction(IDB_STORE, "readwrite");
+      tx.objectStore(IDB_STORE).put(entry, IDB_KEY);
+      tx.oncomplete = tx.onerror = tx.onabort = () => db.close();
+    } catch (err) {
+      console.warn("Timetable cache write failed:", err);
+    }
+  }
+
+  // Remove the offline timetable copy: the IndexedDB database and the
+  // service worker caches. Other site data (e.g. the theme) is kept.
+  function clearOfflineData() {
+    const dropDb = new Promise((resolve) => {
+      if (!window.indexedDB) return resolve();
+      const req = indexedDB.deleteDatabase(IDB_NAME);
+      req.onsuccess = req.onerror = req.onblocked = () => resolve();
+    });
+    const dropCaches = window.caches
+      ? caches
+          .keys()
+          .then((keys) =>
+            Promise.all(
+              keys
+                .filter((k) => k.startsWith(SW_CACHE_PREFIX))
+                .map((k) => caches.delete(k))
+            )
+          )
+          .catch(() => {})
+      : Promise.resolve();
+    // Never hold up logout for long
+    const timeout = new Promise((resolve) => setTimeout(resolve, 1000));
+    return Promise.race([Promise.all([dropDb, dropCaches]), timeout]);
+  }
+  function initLogoutCleanup() {
+    const form = document.getElementById("logoutForm");
+    if (!form) return;
+    form.addEventListener("submit", (e) => {
+      e.preventDefault();
+      clearOfflineData().then(() => form.submit());
+    });
+  }
+
+  // Reuse the local copy when it matches the version in the page, otherwise
+  // download it; fall back to whatever is stored if the network is down.
+  async function loadTimetableData() {
+    if (typeof TIMETABLE_VERSION === "undefined") return undefined;
+    const cached = await readCachedTimetable();
+    if (cached && cached.version === TIMETABLE_VERSION) return cached.data;
+    try {
+      const headers = cached ? { "If-None-Match": `"${cached.version}"` } : {};
+      const resp = await fetch(TIMETABLE_URL, { headers, credentials: "same-origin" });
+      if (resp.status === 304 && cached) return cached.data;
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      const payload = await resp.json();
+      await writeCachedTimetable({ version: payload.version, data: payload.data });
+      return payload.data;
+    } catch (err) {
+      if (cached) {
+        showToast({ type: "warning", message: "Offline: showing the last saved timetable." });
+        return cached.data;
+      }
+      throw err;
+    }
+  }
+
   function initializeDataFromBackend() {
     if (typeof SERVER_DATA === "undefined") {
       DAYS = [];
@@ -655,6 +755,7 @@
     initTheme();
     initProfileMenu();
     initPrint();
+    initLogoutCleanup();
     initViewControls();
     contentArea = document.getElementById("contentArea");
     editorOverlay = document.getElementById("editorOverlay");
@@ -670,12 +771,16 @@
     edDelete = document.getElementById("edDelete");
     bindEditorButtons();
     bindGlobalHandlers();
-    try {
-      initializeDataFromBackend();
-      render();
-    } catch (err) {
-      console.error("Timetable init error:", err);
-    }
+    loadTimetableData()
+      .then((data) => {
+        SERVER_DATA = data;
+        initializeDataFromBackend();
+        render();
+      })
+      .catch((err) => {
+        console.error("Timetable init error:", err);
+        showToast({ type: "error", message: "Could not load the timetable." });
+      });
     document.addEventListener("viewchange", (ev) => {
       currentView = ev.detail.view || "classes";
       render();
@@ -0,0 +1,156 @@
+// Service worker: precaches static assets and keeps the timetable page
+// viewable when the network is flaky. Timetable data itself lives in
+// IndexedDB (see loadTimetableData in script.js).
+// Keep the "tt-" prefix: script.js deletes caches with it on logout.
+const CACHE_VERSION = "tt-v1";
+const STATIC_CACHE = `${CACHE_VERSION}-static`;
+const PAGE_CACHE = `${CACHE_VERSION}-pages`;
+
+// How long a navigation waits for the server before the cached page is used
+const NAVIGATION_TIMEOUT_MS = 3000;
+
+const PRECACHE_URLS = ["/static/script.js", "/static/styles.css"];
+
+// Third-party libraries the timetable page needs to render and print offline
+const CDN_HOSTS = ["cdn.tailwindcss.com", "cdnjs.cloudflare.com"];
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    caches
+      .open(STATIC_CACHE)
+      .then((cache) => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches
+      .keys()
+      .then((keys) =>
+        Promise.all(
+          keys
+            .filter((k) => !k.startsWith(CACHE_VERSION))
+            .map((k) => caches.delete(k))
+        )
+      )
+      .then(() => self.clients.claim())
+  );
+});
+
+// Serve from cache immediately, refresh the cached copy in the background.
+// Only used for third-party libraries, whose URLs are pinned or stable.
+function staleWhileRevalidate(request) {
+  return caches.open(STATIC_CACHE).then((cache) =>
+    cache.match(request).then((cached) => {
+      const network = fetch(request)
+        .then((resp) => {
+          if (resp && (resp.ok || resp.type === "opaque")) {
+            cache.put(request, resp.clone());
+          }
+          return resp;
+        })
+        .catch(() => cached);
+      return cached || network;
+    })
+  );
+}
+
+// Our own assets are not versioned by URL, so always ask the server first
+// (the page and script.js must come from the same deploy) and use the
+// cached copy only when the network is unavailable.
+function networkFirstAsset(request) {
+  return fetch(request)
+    .then((resp) => {
+      if (resp.ok) {
+        const copy = resp.clone();
+        caches.open(STATIC_CACHE).then((cache) => cache.put(request, copy));
+      }
+      return resp;
+    })
+    .catch(() =>
+      caches.match(request).then((cached) => cached || Response.error())
+    );
+}
+
+// The session is gone: forget the saved page and, if it was already shown
+// because the server was slow, reload so the redirect to login is followed.
+function dropCachedPage(request, clientId) {
+  return caches
+    .open(PAGE_CACHE)
+    .then((cache) => cache.delete(request))
+    .then(() => (clientId ? self.clients.get(clientId) : null))
+    .then((client) => client && client.navigate(request.url))
+    .catch(() => {});
+}
+
+// Try the server first (the page carries the current timetable version).
+// Redirects (e.g. to login) and other non-5xx answers are passed through;
+// the last good copy is used only for 5xx, network errors, or when the
+// server takes longer than NAVIGATION_TIMEOUT_MS. A slow response still
+// refreshes the cache in the background.
+function networkFirstPage(event) {
+  const { request } = event;
+  let servedFromCache = false;
+  const network = fetch(request)
+    .then((resp) => {
+      if (
+        resp.type === "opaqueredirect" ||
+        resp.status === 401 ||
+        resp.status === 403
+      ) {
+        event.waitUntil(
+          dropCachedPage(request, servedFromCache ? event.resultingClientId : null)
+        );
+        return resp;
+      }
+      if (resp.status < 500) {
+        if (resp.ok && !resp.redirected) {
+          const copy = resp.clone();
+          event.waitUntil(
+            caches.open(PAGE_CACHE).then((cache) => cache.put(request, copy))
+          );
+        }
+        return resp;
+      }
+      return caches.match(request).then((cached) => cached || resp);
+    })
+    .catch(() =>
+      caches
+        .match(request)
+        .then((cached) => cached || Response.error())
+    );
+  event.waitUntil(network.catch(() => {}));
+
+  const timeout = new Promise((resolve) =>
+    setTimeout(resolve, NAVIGATION_TIMEOUT_MS)
+  )
+    .then(() => caches.match(request))
+    .then((cached) => {
+      if (!cached) return network;
+      servedFromCache = true;
+      return cached;
+    });
+
+  return Promise.race([network, timeout]);
+}
+
+self.addEventListener("fetch", (event) => {
+  const { request } = event;
+  if (request.method !== "GET") return;
+  const url = new URL(request.url);
+
+  if (url.origin === self.location.origin) {
+    if (url.pathname.startsWith("/static/")) {
+      event.respondWith(networkFirstAsset(request));
+    } else if (request.mode === "navigate" && url.pathname === "/") {
+      event.respondWith(networkFirstPage(event));
+    }
+    // Everything else (API, auth, settings) goes straight to the network.
+    return;
+  }
+
+  if (CDN_HOSTS.includes(url.hostname)) {
+    event.respondWith(staleWhileRevalidate(request));
+  }
+});